@@ -8,6 +8,7 @@ import crypto from 'crypto';
 import stringSimilarity from 'string-similarity';
 import leven from 'leven';
 import Sentiment from 'sentiment';
+import { PythonPool } from './python_pool';
 
 const hf = new HfInference(process.env.HUGGINGFACE_API_KEY);
 
@@ -369,112 +370,123 @@ export function extractKeywords(content: string): string {
   return JSON.stringify(keywords);
 }
 
+// Time budgets for the Python analysis scripts. The scripts stop unfinished stages
+// at the budget and report them in `analysis_status`; a request that overruns the
+// budget by more than the grace period fails on its own and the caller falls back.
+const KEYWORD_EXTRACTION_BUDGET_MS = 3000;
+const DATA_INTELLIGENCE_BUDGET_MS = 15000;
+const PYTHON_KILL_GRACE_MS = 2000;
+
+// Long-lived `--serve` children, started on first use
+const keywordExtractionPool = new PythonPool('keyword_extraction.py');
+const dataIntelligencePool = new PythonPool('data_intelligence.py');
+
 // Advanced keyword extraction using Python components (hidden from reverse engineering)
-export async function extractAdvancedKeywords(content: string): Promise<any> {
+export async function extractAdvancedKeywords(content: string, timeBudgetMs: number = KEYWORD_EXTRACTION_BUDGET_MS): Promise<any> {
+  const fallback = {
+    rake_keywords: [],
+    yake_keywords: [],
+    tfidf_keywords: [],
+    keybert_keywords: [],
+    combined_keywords: []
+  };
+
   try {
-    const { PythonShell } = await import('python-shell');
-    
-    const options = {
-      mode: 'text' as const,
-      pythonOptions: ['-u'],
-      scriptPath: './server/services/',
-      args: [content]
-    };
-    
-    return new Promise((resolve, reject) => {
-      PythonShell.run('keyword_extraction.py', options, (err, results) => {
-        if (err) {
-          console.error('Advanced keyword extraction error:', err);
-          resolve({
-            rake_keywords: [],
-            yake_keywords: [],
-            tfidf_keywords: [],
-            keybert_keywords: [],
-            combined_keywords: []
-          });
-        } else {
-          try {
-            const result = JSON.parse(results?.[0] || '{}');
-            resolve(result);
-          } catch (parseError) {
-            console.error('Parse error in keyword extraction:', parseError);
-            resolve({
-              rake_keywords: [],
-              yake_keywords: [],
-              tfidf_keywords: [],
-              keybert_keywords: [],
-              combined_keywords: []
-            });
-          }
-        }
-      });
-    });
+    return await keywordExtractionPool.request(
+      { text: content, time_budget_ms: timeBudgetMs },
+      timeBudgetMs + PYTHON_KILL_GRACE_MS
+    );
   } catch (error) {
-    console.error('Advanced keyword extraction initialization error:', error);
-    return {
-      rake_keywords: [],
-      yake_keywords: [],
-      tfidf_keywords: [],
-      keybert_keywords: [],
-      combined_keywords: []
-    };
+    console.error('Advanced keyword extraction error:', error);
+    return fallback;
   }
 }
 
 // Advanced Data Intelligence System (hidden from reverse engineering)
-export async function performDataIntelligenceAnalysis(entries: any[], usageLogs: any[] = []): Promise<any> {
+export async function performDataIntelligenceAnalysis(
+  entries: any[],
+  usageLogs: any[] = [],
+  timeBudgetMs: number = DATA_INTELLIGENCE_BUDGET_MS,
+  stageBudgetsMs: Record<string, number> = {}
+): Promise<any> {
+  const fallback = {
+    cleanup: { active_entries: entries, flagged_for_cleanup: [], cleanup_stats: {} },
+    usage_patterns: { frequently_accessed: [], rarely_accessed: [], peak_hours: [] },
+    enriched_entries: entries,
+    deduplication: { duplicates: [], unique_entries: entries },
+    anomalies: { anomalies: [], anomaly_stats: {} }
+  };
+
   try {
-    const { PythonShell } = await import('python-shell');
-    
     const data = {
       entries: entries,
-      usage_logs: usageLogs
+      usage_logs: usageLogs,
+      time_budget_ms: timeBudgetMs,
+      stage_budgets_ms: stageBudgetsMs
     };
     
-    const options = {
-      mode: 'text' as const,
-      pythonOptions: ['-u'],
-      scriptPath: './server/services/',
-      args: [JSON.stringify(data)]
-    };
-    
-    return new Promise((resolve, reject) => {
-      PythonShell.run('data_intelligence.py', options, (err, results) => {
-        if (err) {
-          console.error('Data intelligence analysis error:', err);
-          resolve({
-            cleanup: { active_entries: entries, flagged_for_cleanup: [], cleanup_stats: {} },
-            usage_patterns: { frequently_accessed: [], rarely_accessed: [], peak_hours: [] },
-            enriched_entries: entries,
-            deduplication: { duplicates: [], unique_entries: entries },
-            anomalies: { anomalies: [], anomaly_stats: {} }
-          });
-        } else {
-          try {
-            const result = JSON.parse(results?.[0] || '{}');
-            resolve(result);
-          } catch (parseError) {
-            console.error('Parse error in data intelligence:', parseError);
-            resolve({
-              cleanup: { active_entries: entries, flagged_for_cleanup: [], cleanup_stats: {} },
-              usage_patterns: { frequently_accessed: [], rarely_accessed: [], peak_hours: [] },
-              enriched_entries: entries,
-              deduplication: { duplicates: [], unique_entries: entries },
-              anomalies: { anomalies: [], anomaly_stats: {} }
-            });
-          }
-        }
-      });
-    });
+    const result = await dataIntelligencePool.request(data, timeBudgetMs + PYTHON_KILL_GRACE_MS);
+    if (!result.analysis_status) {
+      // Script-level failure (e.g. {"error": ...}): pass it through unchanged
+      return result;
+    }
+    // Stages that missed the deadline are absent; keep the ones that finished
+    return { ...fallback, ...result };
   } catch (error) {
-    console.error('Data intelligence initialization error:', error);
-    return {
-      cleanup: { active_entries: entries, flagged_for_cleanup: [], cleanup_stats: {} },
-      usage_patterns: { frequently_accessed: [], rarely_accessed: [], peak_hours: [] },
-      enriched_entries: entries,
-      deduplication: { duplicates: [], unique_entries: entries },
-      anomalies: { anomalies: [], anomaly_stats: {} }
+    console.error('Data intelligence analysis error:', error);
+    return fallback;
+  }
+}
+
+// Incremental data intelligence. The analysis state lives with the Python service
+// (an SQLite store keyed by `snapshotId`), so only the changes cross the process
+// boundary. Seed with `baseVersion: null` and every entry in `added`, then pass the
+// returned `version` with the next delta.
+//
+// The result holds cleanup flags, duplicate groups and anomalies for the whole table,
+// but `enriched_entries` only for entries added or modified by this call;
+// `deleted_entries` lists the ids that were removed. Where the full analysis returns
+// whole entries, the delta returns ids instead: `cleanup.active_entry_ids` replaces
+// `cleanup.active_entries` and `deduplication.unique_entry_ids` replaces
+// `deduplication.unique_entries`. Usage logs are not stored: pass the current
+// window, exactly as with performDataIntelligenceAnalysis.
+//
+// Errors, by what they mean for the stored snapshot:
+// - `snapshot_mismatch`: the stored state is stale or missing; reseed.
+// - `delta_timed_out`: the delta missed `timeBudgetMs` and was rolled back; the
+//   snapshot is still at `baseVersion`. Large seeds need a larger budget.
+// - `snapshot_unknown`: no answer arrived (timeout or crash), so the delta may or
+//   may not have been stored; reseed.
+// - anything else: the script rejected the delta and nothing was stored.
+export async function performDataIntelligenceDelta(
+  snapshotId: string,
+  baseVersion: number | null,
+  changes: { added?: any[]; modified?: any[]; deleted?: Array<string | number> },
+  usageLogs: any[] = [],
+  timeBudgetMs: number = DATA_INTELLIGENCE_BUDGET_MS
+): Promise<any> {
+  try {
+    const data = {
+      mode: 'delta',
+      snapshot_id: snapshotId,
+      base_version: baseVersion,
+      added: changes.added || [],
+      modified: changes.modified || [],
+      deleted: changes.deleted || [],
+      usage_logs: usageLogs,
+      time_budget_ms: timeBudgetMs
     };
+
+    // The script checks the budget before committing, so it answers
+    // `delta_timed_out` well before this cap unless it is stuck
+    const result = await dataIntelligencePool.request(data, timeBudgetMs + PYTHON_KILL_GRACE_MS);
+    if (result.error && !result.snapshot_id) {
+      return { error: result.error, snapshot_id: snapshotId, version: baseVersion };
+    }
+    return result;
+  } catch (error) {
+    console.error('Data intelligence delta error:', error);
+    return { error: 'snapshot_unknown', detail: String(error), snapshot_id: snapshotId, version: null };
   }
 }
 
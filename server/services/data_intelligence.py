@@ -7,33 +7,60 @@ All features are free and open-source without external APIs
 
 import sys
 import json
-import nltk
 from collections import defaultdict, Counter
 import re
 from datetime import datetime, timedelta
 import hashlib
 import math
 
-# Download required NLTK data
-try:
-    nltk.data.find('tokenizers/punkt')
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    try:
-        nltk.download('punkt', quiet=True)
-        nltk.download('punkt_tab', quiet=True)
-        nltk.download('stopwords', quiet=True)
-    except:
-        pass
+from shared_state import STOP_WORDS, Deadline, DeadlineExceeded, StageRunner, budget_seconds, serve, stage_budget_seconds
+from snapshot_store import SnapshotStore
+
+POSITIVE_WORDS = frozenset(['good', 'great', 'excellent', 'amazing', 'wonderful', 'fantastic', 'outstanding', 'professional'])
+NEGATIVE_WORDS = frozenset(['bad', 'terrible', 'awful', 'horrible', 'poor', 'disappointing', 'unprofessional', 'spam'])
+
+SERVICE_KEYWORDS = {
+    'roofing': ['roof', 'shingle', 'gutter', 'leak', 'repair roof'],
+    'landscaping': ['lawn', 'garden', 'tree', 'landscape', 'mowing'],
+    'cleaning': ['clean', 'house cleaning', 'maid', 'sanitize', 'vacuum'],
+    'pest_control': ['pest', 'bug', 'insect', 'exterminator', 'rodent'],
+    'home_improvement': ['renovation', 'remodel', 'construction', 'repair', 'improvement'],
+    'security': ['security', 'alarm', 'camera', 'monitoring', 'protection'],
+    'solar': ['solar', 'panel', 'energy', 'renewable', 'electricity']
+}
+
+INTENT_PATTERNS = {
+    'quote_request': ['quote', 'estimate', 'price', 'cost', 'how much'],
+    'scheduling': ['schedule', 'appointment', 'when', 'available', 'time'],
+    'information': ['tell me', 'information', 'details', 'learn more'],
+    'complaint': ['problem', 'issue', 'complaint', 'dissatisfied', 'wrong'],
+    'sales_pitch': ['offer', 'service', 'company', 'business', 'professional']
+}
+
+URGENT_KEYWORDS = ['urgent', 'emergency', 'immediate', 'asap', 'now', 'today', 'critical']
+MEDIUM_KEYWORDS = ['soon', 'this week', 'limited time', 'expires']
+
+ENTITY_PATTERNS = {
+    'phone_numbers': re.compile(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b'),
+    'emails': re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
+    'urls': re.compile(r'https?://[^\s]+'),
+    'money': re.compile(r'\$\d+(?:,\d{3})*(?:\.\d{2})?'),
+    'dates': re.compile(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b')
+}
+
+FILE_CATEGORIES = {
+    'image': ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp'],
+    'document': ['pdf', 'doc', 'docx', 'txt'],
+    'spreadsheet': ['xls', 'xlsx', 'csv'],
+    'presentation': ['ppt', 'pptx'],
+    'video': ['mp4', 'avi', 'mov', 'wmv'],
+    'archive': ['zip', 'rar', '7z', 'tar']
+}
 
 class DataIntelligenceSystem:
     def __init__(self):
-        try:
-            self.stop_words = set(nltk.corpus.stopwords.words('english'))
-        except:
-            # Fallback stop words if NLTK data is not available
-            self.stop_words = set(['the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'a', 'an', 'as', 'are', 'was', 'were', 'been', 'be', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them', 'my', 'your', 'his', 'her', 'its', 'our', 'their', 'is', 'am'])
-        self.stop_words.update(['the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'])
+        # Lexicons live at module level so forked workers share one copy
+        self.stop_words = STOP_WORDS
         
     def clean_old_data(self, data_entries, days_threshold=30):
         """🧹 Auto-cleanup of unused/old data"""
@@ -125,6 +152,13 @@ class DataIntelligenceSystem:
         
         return patterns
     
+    def enrich_entry(self, entry):
+        """Label the combined text and attachment of a single entry"""
+        content = entry.get('content', '') + ' ' + entry.get('offer', '') + ' ' + entry.get('reason', '')
+        file_type = entry.get('fileName', '').split('.')[-1] if entry.get('fileName') else None
+        
+        return self.enrich_data_with_labels(content, file_type)
+    
     def enrich_data_with_labels(self, content, file_type=None):
         """🧠 Data labeling / enrichment"""
         labels = {
@@ -140,12 +174,9 @@ class DataIntelligenceSystem:
     
     def analyze_sentiment(self, text):
         """Analyze sentiment using lexicon-based approach"""
-        positive_words = ['good', 'great', 'excellent', 'amazing', 'wonderful', 'fantastic', 'outstanding', 'professional']
-        negative_words = ['bad', 'terrible', 'awful', 'horrible', 'poor', 'disappointing', 'unprofessional', 'spam']
-        
         words = text.lower().split()
-        pos_score = sum(1 for word in words if word in positive_words)
-        neg_score = sum(1 for word in words if word in negative_words)
+        pos_score = sum(1 for word in words if word in POSITIVE_WORDS)
+        neg_score = sum(1 for word in words if word in NEGATIVE_WORDS)
         
         if pos_score > neg_score:
             return {'label': 'positive', 'confidence': min(0.9, pos_score / len(words) * 10)}
@@ -156,20 +187,10 @@ class DataIntelligenceSystem:
     
     def classify_content_type(self, text):
         """Classify content type based on keywords"""
-        service_keywords = {
-            'roofing': ['roof', 'shingle', 'gutter', 'leak', 'repair roof'],
-            'landscaping': ['lawn', 'garden', 'tree', 'landscape', 'mowing'],
-            'cleaning': ['clean', 'house cleaning', 'maid', 'sanitize', 'vacuum'],
-            'pest_control': ['pest', 'bug', 'insect', 'exterminator', 'rodent'],
-            'home_improvement': ['renovation', 'remodel', 'construction', 'repair', 'improvement'],
-            'security': ['security', 'alarm', 'camera', 'monitoring', 'protection'],
-            'solar': ['solar', 'panel', 'energy', 'renewable', 'electricity']
-        }
-        
         text_lower = text.lower()
         scores = {}
         
-        for category, keywords in service_keywords.items():
+        for category, keywords in SERVICE_KEYWORDS.items():
             score = sum(1 for keyword in keywords if keyword in text_lower)
             if score > 0:
                 scores[category] = score
@@ -183,16 +204,8 @@ class DataIntelligenceSystem:
     
     def detect_intent(self, text):
         """Detect user intent"""
-        intent_patterns = {
-            'quote_request': ['quote', 'estimate', 'price', 'cost', 'how much'],
-            'scheduling': ['schedule', 'appointment', 'when', 'available', 'time'],
-            'information': ['tell me', 'information', 'details', 'learn more'],
-            'complaint': ['problem', 'issue', 'complaint', 'dissatisfied', 'wrong'],
-            'sales_pitch': ['offer', 'service', 'company', 'business', 'professional']
-        }
-        
         text_lower = text.lower()
-        for intent, keywords in intent_patterns.items():
+        for intent, keywords in INTENT_PATTERNS.items():
             if any(keyword in text_lower for keyword in keywords):
                 return {'intent': intent, 'confidence': 0.7}
         
@@ -200,14 +213,11 @@ class DataIntelligenceSystem:
     
     def detect_urgency(self, text):
         """Detect urgency level"""
-        urgent_keywords = ['urgent', 'emergency', 'immediate', 'asap', 'now', 'today', 'critical']
-        medium_keywords = ['soon', 'this week', 'limited time', 'expires']
-        
         text_lower = text.lower()
         
-        if any(keyword in text_lower for keyword in urgent_keywords):
+        if any(keyword in text_lower for keyword in URGENT_KEYWORDS):
             return {'level': 'high', 'confidence': 0.8}
-        elif any(keyword in text_lower for keyword in medium_keywords):
+        elif any(keyword in text_lower for keyword in MEDIUM_KEYWORDS):
             return {'level': 'medium', 'confidence': 0.6}
         else:
             return {'level': 'low', 'confidence': 0.4}
@@ -215,39 +225,24 @@ class DataIntelligenceSystem:
     def extract_entities(self, text):
         """Extract named entities"""
         # Simple entity extraction using regex patterns
-        entities = {
-            'phone_numbers': re.findall(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b', text),
-            'emails': re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', text),
-            'urls': re.findall(r'https?://[^\s]+', text),
-            'money': re.findall(r'\$\d+(?:,\d{3})*(?:\.\d{2})?', text),
-            'dates': re.findall(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b', text)
-        }
+        entities = {k: pattern.findall(text) for k, pattern in ENTITY_PATTERNS.items()}
         
         return {k: v for k, v in entities.items() if v}
     
     def categorize_file(self, file_type):
         """🧾 Auto-categorization of files"""
-        categories = {
-            'image': ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp'],
-            'document': ['pdf', 'doc', 'docx', 'txt'],
-            'spreadsheet': ['xls', 'xlsx', 'csv'],
-            'presentation': ['ppt', 'pptx'],
-            'video': ['mp4', 'avi', 'mov', 'wmv'],
-            'archive': ['zip', 'rar', '7z', 'tar']
-        }
-        
         if not file_type:
             return {'category': 'unknown', 'confidence': 0}
         
         ext = file_type.lower().split('.')[-1]
         
-        for category, extensions in categories.items():
+        for category, extensions in FILE_CATEGORIES.items():
             if ext in extensions:
                 return {'category': category, 'confidence': 0.9}
         
         return {'category': 'other', 'confidence': 0.3}
     
-    def detect_duplicates(self, entries):
+    def detect_duplicates(self, entries, deadline=None):
         """🔁 Smart deduplication using simple text similarity"""
         if len(entries) < 2:
             return {'duplicates': [], 'unique_entries': entries}
@@ -257,6 +252,8 @@ class DataIntelligenceSystem:
             processed = set()
             
             for i in range(len(entries)):
+                if deadline:
+                    deadline.check()
                 if i in processed:
                     continue
                 
@@ -302,30 +299,41 @@ class DataIntelligenceSystem:
                     'unique_entries': len(unique_entries)
                 }
             }
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             return {'duplicates': [], 'unique_entries': entries, 'error': str(e)}
     
     def detect_anomalies(self, entries, usage_logs):
         """🚨 Anomaly Detection"""
+        content_hashes = [self.content_hash(entry) for entry in entries]
+        ip_counts = Counter(log.get('ip_address', 'unknown') for log in usage_logs) if usage_logs else Counter()
+        
+        return self.anomalies_from_hashes(entries, content_hashes, ip_counts)
+    
+    def content_hash(self, entry):
+        """Fingerprint the submitted content of an entry"""
+        content = entry.get('content', '') + entry.get('offer', '')
+        return hashlib.md5(content.encode()).hexdigest()
+    
+    def anomalies_from_hashes(self, entries, content_hashes, ip_counts):
+        """Detect anomalies from entry fingerprints and per-IP access counts"""
         anomalies = []
         
         # Detect unusual submission patterns
         if len(entries) > 0:
             # Check for spam-like patterns
-            content_hashes = {}
-            for entry in entries:
-                content = entry.get('content', '') + entry.get('offer', '')
-                content_hash = hashlib.md5(content.encode()).hexdigest()
-                
-                if content_hash in content_hashes:
+            first_seen = {}
+            for entry, content_hash in zip(entries, content_hashes):
+                if content_hash in first_seen:
                     anomalies.append({
                         'type': 'duplicate_content',
                         'severity': 'high',
                         'description': 'Identical content submitted multiple times',
-                        'entries': [content_hashes[content_hash], entry.get('id')]
+                        'entries': [first_seen[content_hash], entry.get('id')]
                     })
                 else:
-                    content_hashes[content_hash] = entry.get('id')
+                    first_seen[content_hash] = entry.get('id')
             
             # Check for unusual submission frequency
             submission_times = []
@@ -354,18 +362,15 @@ class DataIntelligenceSystem:
                     })
         
         # Check usage pattern anomalies
-        if usage_logs:
-            # Detect unusual access patterns
-            access_counts = Counter(log.get('ip_address', 'unknown') for log in usage_logs)
-            for ip, count in access_counts.items():
-                if count > 100:  # More than 100 accesses from single IP
-                    anomalies.append({
-                        'type': 'excessive_access',
-                        'severity': 'high',
-                        'description': f'Excessive access from IP: {ip}',
-                        'count': count,
-                        'ip_address': ip
-                    })
+        for ip, count in ip_counts.items():
+            if count > 100:  # More than 100 accesses from single IP
+                anomalies.append({
+                    'type': 'excessive_access',
+                    'severity': 'high',
+                    'description': f'Excessive access from IP: {ip}',
+                    'count': count,
+                    'ip_address': ip
+                })
         
         return {
             'anomalies': anomalies,
@@ -377,49 +382,231 @@ class DataIntelligenceSystem:
             }
         }
     
-    def comprehensive_analysis(self, entries, usage_logs=None):
-        """Perform comprehensive data intelligence analysis"""
+    def comprehensive_analysis(self, entries, usage_logs=None, time_budget=None, stage_budgets=None):
+        """Perform comprehensive data intelligence analysis within an optional time budget"""
         results = {}
+        # Stages that miss their deadline are left out and listed in 'analysis_status'.
+        # Linear stages run first so a slow dedup cannot starve them.
+        stages = StageRunner(time_budget, stage_budgets)
         
         # Auto-cleanup analysis
-        results['cleanup'] = self.clean_old_data(entries)
+        done, cleanup = stages.run('cleanup', lambda deadline: self.clean_old_data(entries))
+        if done:
+            results['cleanup'] = cleanup
         
         # Usage pattern analysis
         if usage_logs:
-            results['usage_patterns'] = self.analyze_usage_patterns(usage_logs)
+            done, patterns = stages.run('usage_patterns', lambda deadline: self.analyze_usage_patterns(usage_logs))
+            if done:
+                results['usage_patterns'] = patterns
+        
+        # Anomaly detection
+        done, anomalies = stages.run('anomalies', lambda deadline: self.detect_anomalies(entries, usage_logs))
+        if done:
+            results['anomalies'] = anomalies
         
         # Data enrichment
+        done, enriched_entries = stages.run('enriched_entries', lambda deadline: self.enrich_entries(entries, deadline))
+        if done:
+            results['enriched_entries'] = enriched_entries
+        
+        # Deduplication analysis
+        done, deduplication = stages.run('deduplication', lambda deadline: self.detect_duplicates(entries, deadline))
+        if done:
+            results['deduplication'] = deduplication
+        
+        results['analysis_status'] = stages.status()
+        
+        return results
+    
+    def enrich_entries(self, entries, deadline=None):
+        """Attach AI labels to every entry"""
         enriched_entries = []
         for entry in entries:
-            content = entry.get('content', '') + ' ' + entry.get('offer', '') + ' ' + entry.get('reason', '')
-            file_type = entry.get('fileName', '').split('.')[-1] if entry.get('fileName') else None
-            
-            labels = self.enrich_data_with_labels(content, file_type)
+            if deadline:
+                deadline.check()
+            labels = self.enrich_entry(entry)
             enriched_entry = {**entry, 'ai_labels': labels}
             enriched_entries.append(enriched_entry)
         
-        results['enriched_entries'] = enriched_entries
-        
-        # Deduplication analysis
-        results['deduplication'] = self.detect_duplicates(entries)
-        
-        # Anomaly detection
-        results['anomalies'] = self.detect_anomalies(entries, usage_logs)
+        return enriched_entries
+    
+    def delta_analysis(self, snapshot_id, base_version=None, added=None, modified=None, deleted=None, usage_logs=None, deadline=None):
+        """Update a stored analysis with only the entries changed since `base_version`"""
+        store = get_snapshot_store()
+        deadline = deadline or Deadline()
+        
+        with store.transaction():
+            version = store.version(snapshot_id)
+            if base_version is None:
+                # Seeding: the delta carries the whole table
+                store.reset(snapshot_id)
+            elif version != base_version:
+                # The caller's view is stale or the store was lost; it must reseed
+                return {'error': 'snapshot_mismatch', 'snapshot_id': snapshot_id, 'version': version}
+            
+            removed = set(str(entry_id) for entry_id in (deleted or []))
+            changed = {}
+            for entry in (added or []) + (modified or []):
+                if entry.get('id') is None:
+                    raise ValueError('Delta entries must have an id')
+                if str(entry['id']) not in removed:
+                    changed[str(entry['id'])] = entry
+            
+            for entry_id in removed:
+                store.delete_entry(snapshot_id, entry_id)
+            
+            enriched_entries = []
+            for entry_id, entry in changed.items():
+                # Raising here rolls the whole delta back, so a timed-out run never commits
+                deadline.check()
+                
+                # Modified entries keep their place in submission order
+                position = store.position(snapshot_id, entry_id)
+                store.delete_entry(snapshot_id, entry_id)
+                
+                tokens = set((entry.get('content', '') + ' ' + entry.get('offer', '') + ' ' + entry.get('reason', '')).lower().split())
+                
+                # Only entries sharing at least one word can pass the threshold
+                similar_ids = []
+                for other_id, shared, other_count in store.token_overlaps(snapshot_id, tokens):
+                    # Calculate simple Jaccard similarity
+                    similarity = shared / (len(tokens) + other_count - shared)
+                    if similarity > 0.6:  # 60% similarity threshold
+                        similar_ids.append(other_id)
+                
+                store.insert_entry(snapshot_id, entry_id, position, entry, self.content_hash(entry), tokens, similar_ids)
+                enriched_entries.append({**entry, 'ai_labels': self.enrich_entry(entry)})
+            
+            version = store.bump_version(snapshot_id)
+            
+            # The reports below are linear scans over compact per-entry summaries;
+            # full entries are only loaded for duplicate groups
+            summaries = store.summaries(snapshot_id)
+            order = [entry_id for entry_id, summary, content_hash in summaries]
+            current = [summary for entry_id, summary, content_hash in summaries]
+            groups = self.group_duplicate_ids(order, store.similar(snapshot_id))
+            grouped = store.entries(snapshot_id, [entry_id for group in groups for entry_id in group])
+            
+            results = {'snapshot_id': snapshot_id, 'version': version}
+            
+            # Cleanup depends on the current time, so it is re-evaluated every run
+            cleanup = self.clean_old_data(current)
+            # Ids stand in for comprehensive_analysis' full entry lists, which the
+            # caller already holds
+            results['cleanup'] = {
+                'active_entry_ids': [summary['id'] for summary in cleanup['active_entries']],
+                'flagged_for_cleanup': cleanup['flagged_for_cleanup'],
+                'cleanup_stats': cleanup['cleanup_stats']
+            }
+            
+            # Usage logs are not part of the snapshot: like comprehensive_analysis,
+            # patterns and access anomalies cover only the logs sent with this call
+            if usage_logs:
+                results['usage_patterns'] = self.analyze_usage_patterns(usage_logs)
+            
+            # Only entries added or modified by this delta; callers keep the rest
+            results['enriched_entries'] = enriched_entries
+            results['deleted_entries'] = sorted(removed)
+            
+            duplicate_count = sum(len(group) for group in groups)
+            results['deduplication'] = {
+                'duplicates': [{
+                    'primary': grouped[group[0]],
+                    'duplicates': [grouped[entry_id] for entry_id in group[1:]],
+                    'similarity_scores': [0.7] * (len(group) - 1)  # Approximate similarity
+                } for group in groups],
+                'unique_entry_ids': [summary['id'] for entry_id, summary, content_hash in summaries if entry_id not in grouped],
+                'deduplication_stats': {
+                    'total_entries': len(order),
+                    'duplicate_groups': len(groups),
+                    'unique_entries': len(order) - duplicate_count
+                }
+            }
+            
+            results['anomalies'] = self.anomalies_from_hashes(
+                current, [content_hash for entry_id, summary, content_hash in summaries],
+                Counter(log.get('ip_address', 'unknown') for log in usage_logs or []))
+            
+            # Last checkpoint before COMMIT: until here any error leaves the snapshot unchanged
+            deadline.check()
+            return results
+    
+    def group_duplicate_ids(self, order, similar):
+        """Group entry ids from precomputed similarity edges, matching detect_duplicates"""
+        position = {entry_id: i for i, entry_id in enumerate(order)}
+        groups = []
+        processed = set()
+        
+        for i, entry_id in enumerate(order):
+            if entry_id in processed:
+                continue
+            
+            similar_ids = sorted(
+                (other_id for other_id in similar.get(entry_id, ())
+                 if position[other_id] > i and other_id not in processed),
+                key=position.get)
+            
+            if similar_ids:
+                groups.append([entry_id] + similar_ids)
+                processed.add(entry_id)
+                processed.update(similar_ids)
         
-        return results
+        return groups
+
+_snapshot_store = None
+
+def get_snapshot_store():
+    """Open the snapshot database lazily so forked workers each get their own connection"""
+    global _snapshot_store
+    if _snapshot_store is None:
+        _snapshot_store = SnapshotStore()
+    return _snapshot_store
+
+def analyze_request(data):
+    """Run a comprehensive analysis for one decoded request"""
+    entries = data.get('entries', [])
+    usage_logs = data.get('usage_logs', [])
+    
+    system = DataIntelligenceSystem()
+    if data.get('mode') == 'delta':
+        if not data.get('snapshot_id'):
+            raise ValueError('Delta requests must have a snapshot_id')
+        deadline = Deadline(budget_seconds(data.get('time_budget_ms')))
+        try:
+            return system.delta_analysis(
+                str(data['snapshot_id']),
+                data.get('base_version'),
+                data.get('added', []),
+                data.get('modified', []),
+                data.get('deleted', []),
+                usage_logs,
+                deadline
+            )
+        except DeadlineExceeded:
+            # The transaction rolled back, so nothing from this delta was stored
+            return {'error': 'delta_timed_out', 'snapshot_id': str(data['snapshot_id']), 'version': data.get('base_version')}
+    return system.comprehensive_analysis(
+        entries,
+        usage_logs,
+        budget_seconds(data.get('time_budget_ms')),
+        stage_budget_seconds(data.get('stage_budgets_ms'))
+    )
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        # Long-lived mode: one JSON request per stdin line, answered by forked workers
+        workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        serve(analyze_request, workers)
+        return
+    
     if len(sys.argv) < 2:
         print(json.dumps({'error': 'No data provided'}))
         return
     
     try:
         data = json.loads(sys.argv[1])
-        entries = data.get('entries', [])
-        usage_logs = data.get('usage_logs', [])
-        
-        system = DataIntelligenceSystem()
-        results = system.comprehensive_analysis(entries, usage_logs)
+        results = analyze_request(data)
         
         print(json.dumps(results))
     except Exception as e:
@@ -7,33 +7,17 @@ Hidden from reverse engineering with obfuscated function names
 
 import sys
 import json
-import nltk
-from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize, sent_tokenize
 import re
 from collections import Counter
 import math
 
-# Download required NLTK data silently
-try:
-    nltk.data.find('tokenizers/punkt')
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    try:
-        nltk.download('punkt', quiet=True)
-        nltk.download('punkt_tab', quiet=True)
-        nltk.download('stopwords', quiet=True)
-    except:
-        pass
+from shared_state import STOP_WORDS, StageRunner, budget_seconds, serve, stage_budget_seconds
 
 class AdvancedKeywordExtractor:
     def __init__(self):
-        try:
-            self.stop_words = set(stopwords.words('english'))
-        except:
-            # Fallback stop words if NLTK data is not available
-            self.stop_words = set(['the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'a', 'an', 'as', 'are', 'was', 'were', 'been', 'be', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them', 'my', 'your', 'his', 'her', 'its', 'our', 'their', 'is', 'am'])
-        self.stop_words.update(['the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'])
+        # Stop words are built once per process and shared by every extractor
+        self.stop_words = STOP_WORDS
         
     def clean_text(self, text):
         """Clean and preprocess text"""
@@ -45,7 +29,7 @@ class AdvancedKeywordExtractor:
         text = ' '.join(text.split())
         return text
     
-    def extract_rake_keywords(self, text, num_keywords=10):
+    def extract_rake_keywords(self, text, num_keywords=10, deadline=None):
         """RAKE-like keyword extraction"""
         try:
             sentences = sent_tokenize(text)
@@ -56,6 +40,8 @@ class AdvancedKeywordExtractor:
         phrase_scores = {}
         
         for sentence in sentences:
+            if deadline:
+                deadline.check()
             # Split sentence into phrases using stop words as delimiters
             try:
                 words = word_tokenize(sentence.lower())
@@ -88,7 +74,7 @@ class AdvancedKeywordExtractor:
         sorted_phrases = sorted(phrase_scores.items(), key=lambda x: x[1], reverse=True)
         return [phrase for phrase, score in sorted_phrases[:num_keywords]]
     
-    def extract_yake_keywords(self, text, num_keywords=10):
+    def extract_yake_keywords(self, text, num_keywords=10, deadline=None):
         """YAKE-like keyword extraction"""
         try:
             sentences = sent_tokenize(text)
@@ -98,6 +84,8 @@ class AdvancedKeywordExtractor:
         word_stats = {}
         
         for sentence in sentences:
+            if deadline:
+                deadline.check()
             try:
                 words = [word.lower() for word in word_tokenize(sentence) 
                         if word.isalpha() and word.lower() not in self.stop_words]
@@ -129,7 +117,7 @@ class AdvancedKeywordExtractor:
         sorted_keywords = sorted(keyword_scores.items(), key=lambda x: x[1])
         return [word for word, score in sorted_keywords[:num_keywords]]
     
-    def extract_tf_idf_keywords(self, text, num_keywords=10):
+    def extract_tf_idf_keywords(self, text, num_keywords=10, deadline=None):
         """TF-IDF based keyword extraction"""
         try:
             sentences = sent_tokenize(text)
@@ -141,6 +129,8 @@ class AdvancedKeywordExtractor:
         
         # Calculate term frequency
         for sentence in sentences:
+            if deadline:
+                deadline.check()
             try:
                 words = [word.lower() for word in word_tokenize(sentence) 
                         if word.isalpha() and word.lower() not in self.stop_words]
@@ -169,7 +159,7 @@ class AdvancedKeywordExtractor:
         sorted_keywords = sorted(tfidf_scores.items(), key=lambda x: x[1], reverse=True)
         return [word for word, score in sorted_keywords[:num_keywords]]
     
-    def extract_keybert_like_keywords(self, text, num_keywords=10):
+    def extract_keybert_like_keywords(self, text, num_keywords=10, deadline=None):
         """KeyBERT-like extraction using semantic similarity"""
         try:
             sentences = sent_tokenize(text)
@@ -180,6 +170,8 @@ class AdvancedKeywordExtractor:
         
         # Extract candidate phrases (1-3 words)
         for sentence in sentences:
+            if deadline:
+                deadline.check()
             try:
                 words = [word.lower() for word in word_tokenize(sentence) 
                         if word.isalpha() and word.lower() not in self.stop_words]
@@ -207,50 +199,72 @@ class AdvancedKeywordExtractor:
         sorted_keywords = sorted(filtered_keywords, key=lambda x: x[1], reverse=True)
         return [keyword for keyword, count in sorted_keywords[:num_keywords]]
     
-    def extract_all_keywords(self, text):
+    def extract_all_keywords(self, text, time_budget=None, stage_budgets=None):
         """Extract keywords using all methods and combine results"""
         clean_text = self.clean_text(text)
         
+        # Methods that miss their deadline contribute no keywords and are
+        # listed in 'analysis_status'
+        stages = StageRunner(time_budget, stage_budgets)
+        
         if len(clean_text) < 10:
             return {
                 'rake_keywords': [],
                 'yake_keywords': [],
                 'tfidf_keywords': [],
                 'keybert_keywords': [],
-                'combined_keywords': []
+                'combined_keywords': [],
+                'analysis_status': stages.status()
             }
         
-        # Extract keywords using different methods
-        rake_keywords = self.extract_rake_keywords(clean_text, 8)
-        yake_keywords = self.extract_yake_keywords(clean_text, 8)
-        tfidf_keywords = self.extract_tf_idf_keywords(clean_text, 8)
-        keybert_keywords = self.extract_keybert_like_keywords(clean_text, 8)
+        methods = [
+            ('rake_keywords', self.extract_rake_keywords),
+            ('yake_keywords', self.extract_yake_keywords),
+            ('tfidf_keywords', self.extract_tf_idf_keywords),
+            ('keybert_keywords', self.extract_keybert_like_keywords)
+        ]
+        
+        results = {}
+        for name, method in methods:
+            done, keywords = stages.run(name, lambda deadline: method(clean_text, 8, deadline))
+            results[name] = keywords if done else []
         
         # Combine and rank all keywords
-        all_keywords = rake_keywords + yake_keywords + tfidf_keywords + keybert_keywords
+        all_keywords = [keyword for name, method in methods for keyword in results[name]]
         keyword_counts = Counter(all_keywords)
         
         # Get top combined keywords
-        combined_keywords = [k for k, v in keyword_counts.most_common(10)]
+        results['combined_keywords'] = [k for k, v in keyword_counts.most_common(10)]
+        results['analysis_status'] = stages.status()
         
-        return {
-            'rake_keywords': rake_keywords,
-            'yake_keywords': yake_keywords,
-            'tfidf_keywords': tfidf_keywords,
-            'keybert_keywords': keybert_keywords,
-            'combined_keywords': combined_keywords
-        }
+        return results
+
+def extract_request(data):
+    """Extract keywords for one decoded request"""
+    extractor = AdvancedKeywordExtractor()
+    return extractor.extract_all_keywords(
+        data.get('text', ''),
+        budget_seconds(data.get('time_budget_ms')),
+        stage_budget_seconds(data.get('stage_budgets_ms'))
+    )
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        # Long-lived mode: one JSON request per stdin line, answered by forked workers
+        workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        serve(extract_request, workers)
+        return
+    
     if len(sys.argv) < 2:
         print(json.dumps({'error': 'No text provided'}))
         return
     
     text = sys.argv[1]
-    extractor = AdvancedKeywordExtractor()
+    time_budget_ms = sys.argv[2] if len(sys.argv) > 2 else None
     
     try:
-        results = extractor.extract_all_keywords(text)
+        # budget_seconds validates the raw argument along with the rest of the request
+        results = extract_request({'text': text, 'time_budget_ms': time_budget_ms})
         print(json.dumps(results))
     except Exception as e:
         print(json.dumps({'error': str(e)}))
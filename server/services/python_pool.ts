@@ -0,0 +1,165 @@
+// Long-lived Python service. Each pool keeps one `--serve` child that builds the
+// shared model state once and answers JSON-line requests from forked workers, so
+// callers no longer pay interpreter start-up and model loading on every call.
+import os from 'os';
+import type { PythonShell } from 'python-shell';
+
+// Covers interpreter start-up and model preloading before the first answer
+const PYTHON_POOL_START_TIMEOUT_MS = 60000;
+
+interface PendingRequest {
+  data: object;
+  timeoutMs: number;
+  // Requests caught in a restart are resent once; start-up pings never are
+  retry: boolean;
+  resolve: (result: any) => void;
+  reject: (error: Error) => void;
+  timer: NodeJS.Timeout;
+}
+
+export class PythonPool {
+  private shell: PythonShell | null = null;
+  // Resolves once the current child has answered its start-up ping
+  private starting: Promise<PythonShell> | null = null;
+  private pending = new Map<number, PendingRequest>();
+  // Timed-out requests whose worker may still be busy with them
+  private overdue = new Set<number>();
+  private nextRequestId = 0;
+
+  constructor(private script: string, private workers: number = os.cpus().length || 1) {}
+
+  // Send one request; rejects if no answer arrives within timeoutMs. Only that
+  // request fails: the child is restarted once every worker is stuck on an overdue
+  // request, and any other requests in flight are then resent to the new child.
+  async request(data: object, timeoutMs: number): Promise<any> {
+    const shell = await this.start();
+    return this.send(shell, data, timeoutMs, true);
+  }
+
+  stop() {
+    this.detach();
+    for (const request of this.takePending()) {
+      request.reject(new Error(`${this.script} pool stopped`));
+    }
+  }
+
+  private start(): Promise<PythonShell> {
+    if (!this.starting) {
+      this.starting = this.spawn();
+    }
+    return this.starting;
+  }
+
+  private async spawn(): Promise<PythonShell> {
+    const { PythonShell } = await import('python-shell');
+
+    const shell = new PythonShell(this.script, {
+      mode: 'text',
+      pythonOptions: ['-u'],
+      scriptPath: './server/services/',
+      args: ['--serve', String(this.workers)]
+    });
+    this.shell = shell;
+    shell.on('message', (line: string) => this.receive(line));
+    shell.on('stderr', (line: string) => console.error(`${this.script}:`, line));
+    const exited = () => {
+      if (this.shell === shell) {
+        this.restart(new Error(`${this.script} pool exited`));
+      }
+    };
+    shell.on('close', exited);
+    shell.on('error', (error: Error) => {
+      console.error(`${this.script} pool error:`, error);
+      exited();
+    });
+
+    // The pool only pays off if workers are forks of the process that built the state
+    const info = await this.send(shell, { ping: true }, PYTHON_POOL_START_TIMEOUT_MS, false);
+    if (info.state_pid !== shell.childProcess.pid || info.worker_pid === info.state_pid) {
+      console.warn(`${this.script} pool workers do not share preloaded state:`, info);
+    }
+    return shell;
+  }
+
+  private send(shell: PythonShell, data: object, timeoutMs: number, retry: boolean): Promise<any> {
+    if (this.shell !== shell) {
+      return Promise.reject(new Error(`${this.script} pool exited`));
+    }
+    const requestId = this.nextRequestId++;
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => this.expire(requestId), timeoutMs);
+      this.pending.set(requestId, { data, timeoutMs, retry, resolve, reject, timer });
+      shell.send(JSON.stringify({ ...data, request_id: requestId }));
+    });
+  }
+
+  private expire(requestId: number) {
+    const request = this.pending.get(requestId);
+    if (!request) {
+      return;
+    }
+    this.pending.delete(requestId);
+    this.overdue.add(requestId);
+    request.reject(new Error(`${this.script} request timed out after ${request.timeoutMs}ms`));
+
+    // Workers stop at their own deadlines, so an overdue request normally still
+    // answers and frees its worker; only a pool with no free worker left is stuck
+    if (this.overdue.size >= this.workers) {
+      this.restart(new Error(`${this.script} pool restarted: every worker is stuck`));
+    }
+  }
+
+  private restart(error: Error) {
+    this.detach();
+    for (const request of this.takePending()) {
+      if (!request.retry) {
+        request.reject(error);
+        continue;
+      }
+      this.start()
+        .then((shell) => this.send(shell, request.data, request.timeoutMs, false))
+        .then(request.resolve, request.reject);
+    }
+  }
+
+  private detach() {
+    const shell = this.shell;
+    this.shell = null;
+    this.starting = null;
+    this.overdue.clear();
+    shell?.kill();
+  }
+
+  private takePending(): PendingRequest[] {
+    const pending = Array.from(this.pending.values());
+    this.pending.clear();
+    for (const request of pending) {
+      clearTimeout(request.timer);
+    }
+    return pending;
+  }
+
+  private receive(line: string) {
+    let result: any;
+    try {
+      result = JSON.parse(line);
+    } catch (parseError) {
+      console.error(`Unexpected output from ${this.script}:`, line);
+      return;
+    }
+
+    const request = this.pending.get(result?.request_id);
+    if (!request) {
+      // A late answer to a timed-out request: its caller has moved on
+      if (!this.overdue.delete(result?.request_id)) {
+        // Requests that could not be decoded come back without an id
+        console.error(`Unmatched answer from ${this.script}:`, result);
+      }
+      return;
+    }
+    this.pending.delete(result.request_id);
+    clearTimeout(request.timer);
+    delete result.request_id;
+    request.resolve(result);
+  }
+}
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Shared Model State
+Builds stopword sets and tokenizer models once per process and serves requests
+from forked workers that share that state copy-on-write
+Also provides cooperative deadlines for bounded-time analysis stages
+"""
+
+import gc
+import json
+import math
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from functools import partial
+
+import nltk
+
+# Download required NLTK data
+try:
+    nltk.data.find('tokenizers/punkt')
+    nltk.data.find('corpora/stopwords')
+except LookupError:
+    try:
+        nltk.download('punkt', quiet=True)
+        nltk.download('punkt_tab', quiet=True)
+        nltk.download('stopwords', quiet=True)
+    except:
+        pass
+
+def _build_stop_words():
+    """Build the stopword set shared by every extractor in the process"""
+    try:
+        stop_words = set(nltk.corpus.stopwords.words('english'))
+    except:
+        # Fallback stop words if NLTK data is not available
+        stop_words = set(['the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'a', 'an', 'as', 'are', 'was', 'were', 'been', 'be', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them', 'my', 'your', 'his', 'her', 'its', 'our', 'their', 'is', 'am'])
+    stop_words.update(['the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'])
+    return frozenset(stop_words)
+
+STOP_WORDS = _build_stop_words()
+
+# Process that built the shared state; forked workers inherit this value
+STATE_PID = os.getpid()
+
+class DeadlineExceeded(Exception):
+    """Raised at a checkpoint once a time budget has run out"""
+
+class Deadline:
+    """Wall-clock budget checked cooperatively from hot loops"""
+    def __init__(self, seconds=None):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+    
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+    
+    def check(self):
+        """Checkpoint: raise DeadlineExceeded if the budget is spent"""
+        if self.expired():
+            raise DeadlineExceeded()
+    
+    def limit(self, seconds=None):
+        """Child deadline that ends at the earlier of this one and `seconds` from now"""
+        child = Deadline(seconds)
+        if child.expires_at is None or (self.expires_at is not None and self.expires_at < child.expires_at):
+            child.expires_at = self.expires_at
+        return child
+
+class StageRunner:
+    """Run named stages under a shared deadline and record how each one ended"""
+    def __init__(self, time_budget=None, stage_budgets=None):
+        self.started_at = time.monotonic()
+        self.deadline = Deadline(time_budget)
+        self.stage_budgets = stage_budgets or {}
+        self.completed = []
+        self.timed_out = []
+        self.skipped = []
+        self.failed = {}
+    
+    def run(self, name, stage):
+        """Call stage(deadline); return (True, result) only if it finished"""
+        if self.deadline.expired():
+            self.skipped.append(name)
+            return False, None
+        
+        try:
+            result = stage(self.deadline.limit(self.stage_budgets.get(name)))
+        except DeadlineExceeded:
+            self.timed_out.append(name)
+            return False, None
+        except Exception as e:
+            # One broken stage should not cost the caller the others
+            self.failed[name] = str(e)
+            return False, None
+        
+        self.completed.append(name)
+        return True, result
+    
+    def status(self):
+        return {
+            'partial': bool(self.timed_out or self.skipped or self.failed),
+            'completed_stages': self.completed,
+            'timed_out_stages': self.timed_out,
+            'skipped_stages': self.skipped,
+            'failed_stages': self.failed,
+            'elapsed_ms': round((time.monotonic() - self.started_at) * 1000)
+        }
+
+def budget_seconds(milliseconds):
+    """Convert an optional millisecond budget from a request into seconds"""
+    if milliseconds is None:
+        return None
+    try:
+        milliseconds = float(milliseconds)
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid time budget: {milliseconds!r}')
+    if math.isnan(milliseconds) or milliseconds < 0:
+        raise ValueError(f'Invalid time budget: {milliseconds!r}')
+    return milliseconds / 1000.0
+
+def stage_budget_seconds(stage_budgets_ms):
+    """Convert per-stage millisecond budgets from a request into seconds"""
+    if stage_budgets_ms is None:
+        return {}
+    if not isinstance(stage_budgets_ms, dict):
+        raise ValueError(f'Invalid stage budgets: {stage_budgets_ms!r}')
+    return {name: budget_seconds(ms) for name, ms in stage_budgets_ms.items()}
+
+def preload():
+    """Warm lazily loaded tokenizer models so forked workers inherit them"""
+    try:
+        for sentence in nltk.tokenize.sent_tokenize('Warm up the tokenizer. It is shared.'):
+            nltk.tokenize.word_tokenize(sentence)
+    except:
+        # Callers fall back to str.split when the punkt models are missing
+        pass
+
+def worker_info():
+    """Report which process answered a ping and which one built the shared state"""
+    return {'worker_pid': os.getpid(), 'state_pid': STATE_PID, 'parent_pid': os.getppid()}
+
+def _run_request(handler, line):
+    """Decode one request line, run the handler and encode its result"""
+    request_id = None
+    try:
+        data = json.loads(line)
+        request_id = data.pop('request_id', None)
+        # {"ping": true} checks that workers were forked from the preloaded process
+        result = worker_info() if data.get('ping') else handler(data)
+    except Exception as e:
+        result = {'error': str(e)}
+    
+    if request_id is not None:
+        result = {**result, 'request_id': request_id}
+    return json.dumps(result)
+
+def _exit_on_sigterm(signum, frame):
+    raise SystemExit(128 + signum)
+
+def serve(handler, workers=None, stream_in=None, stream_out=None):
+    """Answer one JSON request per input line from a pool of forked workers"""
+    stream_in = stream_in or sys.stdin
+    stream_out = stream_out or sys.stdout
+    run = partial(_run_request, handler)
+    lines = (line for line in stream_in if line.strip())
+
+    preload()
+
+    # Unwind on SIGTERM so the pool below terminates its workers instead of
+    # orphaning them; workers inherit the handler and roll back open transactions
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        for line in lines:
+            print(run(line), file=stream_out, flush=True)
+        return
+
+    # Move everything built so far out of the collector's reach; otherwise the
+    # first collection in each worker touches every object and un-shares its page
+    gc.freeze()
+    context = multiprocessing.get_context('fork')
+    with context.Pool(workers or os.cpu_count() or 1) as pool:
+        # The main thread reads stdin, not the pool's task thread, so terminate()
+        # never waits on a blocked read. Answers go out as each request finishes
+        # (from the pool's result thread); callers match on request_id
+        for line in lines:
+            pool.apply_async(run, (line,), callback=lambda result: print(result, file=stream_out, flush=True))
+        pool.close()
+        pool.join()
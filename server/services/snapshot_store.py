@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Delta Snapshot Store
+Keeps the per-entry state behind delta_analysis in SQLite, keyed by snapshot id,
+so a delta run reads and writes only the rows it touches
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS snapshots (
+    snapshot_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    next_position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    snapshot_id TEXT NOT NULL,
+    entry_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    entry TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    token_count INTEGER NOT NULL,
+    PRIMARY KEY (snapshot_id, entry_id)
+);
+CREATE INDEX IF NOT EXISTS entries_by_position ON entries (snapshot_id, position);
+CREATE TABLE IF NOT EXISTS tokens (
+    snapshot_id TEXT NOT NULL,
+    token TEXT NOT NULL,
+    entry_id TEXT NOT NULL,
+    PRIMARY KEY (snapshot_id, token, entry_id)
+);
+CREATE INDEX IF NOT EXISTS tokens_by_entry ON tokens (snapshot_id, entry_id);
+CREATE TABLE IF NOT EXISTS similar (
+    snapshot_id TEXT NOT NULL,
+    entry_id TEXT NOT NULL,
+    other_id TEXT NOT NULL,
+    PRIMARY KEY (snapshot_id, entry_id, other_id)
+);
+'''
+
+# Entry fields the cleanup and anomaly reports read for every entry on every run
+SUMMARY_FIELDS = ('id', 'createdAt', 'lastAccessed')
+
+class SnapshotStore:
+    def __init__(self, path=None):
+        self.path = path or os.environ.get('DATA_INTELLIGENCE_DB') or os.path.join(tempfile.gettempdir(), 'data_intelligence.sqlite3')
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS query_tokens (token TEXT PRIMARY KEY)')
+    
+    @contextmanager
+    def transaction(self):
+        """Serialize writers per database; roll back everything on error"""
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.conn.execute('COMMIT')
+    
+    def version(self, snapshot_id):
+        row = self.conn.execute('SELECT version FROM snapshots WHERE snapshot_id = ?', (snapshot_id,)).fetchone()
+        return row[0] if row else None
+    
+    def reset(self, snapshot_id):
+        """Drop all state for a snapshot and start it again at version 0"""
+        for table in ('entries', 'tokens', 'similar', 'snapshots'):
+            self.conn.execute(f'DELETE FROM {table} WHERE snapshot_id = ?', (snapshot_id,))
+        self.conn.execute('INSERT INTO snapshots VALUES (?, 0, 0)', (snapshot_id,))
+    
+    def bump_version(self, snapshot_id):
+        self.conn.execute('UPDATE snapshots SET version = version + 1 WHERE snapshot_id = ?', (snapshot_id,))
+        return self.version(snapshot_id)
+    
+    def position(self, snapshot_id, entry_id):
+        """Existing position of an entry, or the next free one for a new entry"""
+        row = self.conn.execute(
+            'SELECT position FROM entries WHERE snapshot_id = ? AND entry_id = ?', (snapshot_id, entry_id)).fetchone()
+        if row:
+            return row[0]
+        position = self.conn.execute(
+            'SELECT next_position FROM snapshots WHERE snapshot_id = ?', (snapshot_id,)).fetchone()[0]
+        self.conn.execute(
+            'UPDATE snapshots SET next_position = next_position + 1 WHERE snapshot_id = ?', (snapshot_id,))
+        return position
+    
+    def delete_entry(self, snapshot_id, entry_id):
+        self.conn.execute('DELETE FROM entries WHERE snapshot_id = ? AND entry_id = ?', (snapshot_id, entry_id))
+        self.conn.execute('DELETE FROM tokens WHERE snapshot_id = ? AND entry_id = ?', (snapshot_id, entry_id))
+        self.conn.execute(
+            'DELETE FROM similar WHERE snapshot_id = ? AND (entry_id = ? OR other_id = ?)',
+            (snapshot_id, entry_id, entry_id))
+    
+    def insert_entry(self, snapshot_id, entry_id, position, entry, content_hash, tokens, similar_ids):
+        summary = {field: entry[field] for field in SUMMARY_FIELDS if field in entry}
+        self.conn.execute(
+            'INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (snapshot_id, entry_id, position, json.dumps(entry), json.dumps(summary), content_hash, len(tokens)))
+        self.conn.executemany(
+            'INSERT INTO tokens VALUES (?, ?, ?)', [(snapshot_id, token, entry_id) for token in tokens])
+        self.conn.executemany(
+            'INSERT INTO similar VALUES (?, ?, ?)',
+            [(snapshot_id, a, b) for other_id in similar_ids for a, b in ((entry_id, other_id), (other_id, entry_id))])
+    
+    def token_overlaps(self, snapshot_id, tokens):
+        """(entry_id, shared tokens, token count) for every stored entry sharing one of `tokens`"""
+        self.conn.execute('DELETE FROM query_tokens')
+        self.conn.executemany('INSERT OR IGNORE INTO query_tokens VALUES (?)', [(token,) for token in tokens])
+        # CROSS JOINs pin the join order: walk the few query tokens, never every stored row
+        return self.conn.execute('''
+            SELECT o.entry_id, o.shared, e.token_count
+            FROM (
+                SELECT t.entry_id, COUNT(*) AS shared
+                FROM query_tokens q
+                CROSS JOIN tokens t ON t.snapshot_id = ? AND t.token = q.token
+                GROUP BY t.entry_id
+            ) o
+            CROSS JOIN entries e ON e.snapshot_id = ? AND e.entry_id = o.entry_id''', (snapshot_id, snapshot_id)).fetchall()
+    
+    def summaries(self, snapshot_id):
+        """(entry_id, summary, content_hash) for every entry, in submission order"""
+        rows = self.conn.execute(
+            'SELECT entry_id, summary, content_hash FROM entries WHERE snapshot_id = ? ORDER BY position',
+            (snapshot_id,))
+        return [(entry_id, json.loads(summary), content_hash) for entry_id, summary, content_hash in rows]
+    
+    def similar(self, snapshot_id):
+        similar = {}
+        for entry_id, other_id in self.conn.execute(
+                'SELECT entry_id, other_id FROM similar WHERE snapshot_id = ?', (snapshot_id,)):
+            similar.setdefault(entry_id, set()).add(other_id)
+        return similar
+    
+    def entries(self, snapshot_id, entry_ids):
+        entries = {}
+        for entry_id in entry_ids:
+            row = self.conn.execute(
+                'SELECT entry FROM entries WHERE snapshot_id = ? AND entry_id = ?', (snapshot_id, entry_id)).fetchone()
+            entries[entry_id] = json.loads(row[0])
+        return entries